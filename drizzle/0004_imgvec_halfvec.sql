@@ -0,0 +1,16 @@
+-- Store imgVec as halfvec (fp16) instead of vector (fp32)
+-- Halves storage per row (3 KB -> 1.5 KB) and the bytes sent on insert and PCA fetch;
+-- CLIP embeddings are L2-normalized, so fp16 precision loss is negligible for cosine search
+-- Requires pgvector 0.7.0+
+
+-- HNSW indexes are built with vector_cosine_ops, which cannot index halfvec
+DROP INDEX IF EXISTS idx_artworks_imgvec_eligible;
+DROP INDEX IF EXISTS idx_artworks_imgvec_hnsw;
+
+ALTER TABLE "met-galaxy_artwork" 
+ALTER COLUMN "imgVec" TYPE halfvec(768) USING "imgVec"::halfvec(768);
+
+-- Recreate the partial HNSW index for the field-chunk API eligibility predicate
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_artworks_imgvec_eligible 
+ON "met-galaxy_artwork" USING hnsw ("imgVec" halfvec_cosine_ops) 
+WHERE "imgVec" IS NOT NULL AND "localImageUrl" IS NOT NULL AND "localImageUrl" != '';
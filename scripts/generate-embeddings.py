@@ -6,7 +6,7 @@ This script:
 1. Fetches artworks with localImageUrl but no imgVec
 2. Downloads images from S3
 3. Generates CLIP embeddings using OpenCLIP ViT-L/14
-4. Stores embeddings in PostgreSQL as vectors
+4. Stores embeddings in PostgreSQL as halfvec (fp16) vectors
 
 Usage:
     python scripts/generate-embeddings.py
@@ -15,13 +15,22 @@ Usage:
 import os
 import sys
 import time
-import requests
+import queue
+import asyncio
+import threading
+from collections import defaultdict, deque
+import aiohttp
 import psycopg2
+from psycopg2.extras import execute_values
+from pgvector.psycopg2 import register_vector
 import torch
 import numpy as np
 from PIL import Image
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import open_clip
+from torchvision.io import decode_jpeg, ImageReadMode
+from torchvision.transforms import v2, InterpolationMode
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from dotenv import load_dotenv
 
@@ -47,86 +56,397 @@ PRETRAINED = "openai"  # High-quality pretrained weights
 DEVICE = "mps" if torch.backends.mps.is_available() else "cpu"
 # DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
+DOWNLOAD_CONCURRENCY = 64  # Max open connections for image downloads
+DECODE_WORKERS = os.cpu_count() or 4  # Threads decoding downloaded images
+PREFETCH_BATCHES = 2  # Batches downloaded ahead of the GPU (and in flight at once)
+IMAGE_SIZE = 224  # ViT-L/14 input resolution
+# fp16 autocast for the forward pass on MPS/CUDA; CPU stays fp32
+AUTOCAST_ENABLED = DEVICE in ("mps", "cuda")
+AUTOCAST_DTYPE = torch.float16
+# Resized/cropped uint8 images of artworks whose write failed are cached here so
+# reruns skip download + decode; each crop is deleted once its embedding is committed
+CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', 'cache')
+# Set VALIDATE_PREPROCESS=1 to compare the GPU preprocess against open_clip's on the first batch
+VALIDATE_PREPROCESS = os.getenv('VALIDATE_PREPROCESS') == '1'
+
 print(f"🚀 Starting CLIP embedding generation...")
 print(f"⚙️  Device: {DEVICE}")
 print(f"⚙️  Model: {MODEL_NAME}-{PRETRAINED}")
 print(f"⚙️  Batch size: {BATCH_SIZE}")
+print(f"⚙️  Autocast: {AUTOCAST_DTYPE if AUTOCAST_ENABLED else 'off (fp32)'}")
+
+# uint8 (3, H, W) -> uint8 (3, 224, 224); a no-op on images that are already cropped
+gpu_crop = v2.Compose([
+    v2.Resize(IMAGE_SIZE, interpolation=InterpolationMode.BICUBIC, antialias=True),
+    v2.CenterCrop(IMAGE_SIZE),
+])
+
+def build_gpu_preprocess():
+    """Tensor equivalent of open_clip's PIL preprocess, runnable on DEVICE.
+    
+    Takes a uint8 (3, H, W) tensor and returns a normalized float32 (3, 224, 224) tensor.
+    """
+    return v2.Compose([
+        gpu_crop,
+        v2.ToDtype(torch.float32, scale=True),
+        v2.Normalize(mean=open_clip.OPENAI_DATASET_MEAN, std=open_clip.OPENAI_DATASET_STD),
+    ])
 
 def load_clip_model():
-    """Load CLIP model and preprocessing."""
+    """Load CLIP model and preprocessing.
+    
+    Returns the model, the on-device tensor preprocess, and open_clip's PIL
+    preprocess (kept only for validating the former).
+    """
     print(f"📥 Loading CLIP model: {MODEL_NAME}-{PRETRAINED}...")
-    model, _, preprocess = open_clip.create_model_and_transforms(
+    model, _, pil_preprocess = open_clip.create_model_and_transforms(
         MODEL_NAME, 
         pretrained=PRETRAINED,
         device=DEVICE
     )
     model.eval()
+    # Params stay fp32; autocast handles the half-precision matmuls
+    model = model.to(memory_format=torch.channels_last)
+    
+    # CUDA graphs (reduce-overhead) are CUDA-only; MPS/CPU run eagerly
+    if DEVICE == "cuda":
+        print("🔧 Compiling image encoder (mode=reduce-overhead)...")
+        model.encode_image = torch.compile(model.encode_image, mode="reduce-overhead", fullgraph=False)
+        # Warm up at the pinned batch shape so the first real batch doesn't pay compile cost
+        dummy = torch.zeros(BATCH_SIZE, 3, IMAGE_SIZE, IMAGE_SIZE, device=DEVICE).contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode(), torch.autocast(device_type=DEVICE, dtype=AUTOCAST_DTYPE, enabled=AUTOCAST_ENABLED):
+            model.encode_image(dummy)
+        torch.cuda.synchronize()
+    
     print(f"✅ Model loaded successfully (device: {DEVICE})")
-    return model, preprocess
+    return model, build_gpu_preprocess(), pil_preprocess
+
+def validate_preprocess(preprocess, pil_preprocess, image, tolerance=None):
+    """Check the GPU preprocess output against open_clip's PIL preprocess for one image.
+    
+    Both paths round the resized image to uint8 and AA bicubic only agrees with
+    PIL to within a level or two, so the default tolerance is 2 uint8 levels
+    after normalization (2/255/min(std)).
+    """
+    if tolerance is None:
+        tolerance = 2 / 255 / min(open_clip.OPENAI_DATASET_STD)
+    expected = pil_preprocess(Image.fromarray(image.permute(1, 2, 0).cpu().numpy()))
+    actual = preprocess(image.to(DEVICE)).cpu()
+    diff = (actual - expected).abs()
+    max_diff = diff.max().item()
+    mean_diff = diff.mean().item()
+    if max_diff <= tolerance:
+        print(f"✅ GPU preprocess matches open_clip (max diff {max_diff:.2e}, mean diff {mean_diff:.2e})")
+    else:
+        print(f"⚠️  GPU preprocess differs from open_clip: max diff {max_diff:.2e}, mean diff {mean_diff:.2e} "
+              f"(tolerance {tolerance:.2e})")
+    return max_diff
+
+def decode_image(content):
+    """Decode downloaded image bytes into a uint8 (3, H, W) tensor.
+    
+    On CUDA, JPEGs are decoded straight onto the GPU with nvJPEG, falling back
+    to PIL for layouts nvJPEG rejects (e.g. CMYK).
+    """
+    if DEVICE == "cuda" and content[:3] == b'\xff\xd8\xff':
+        try:
+            raw = torch.frombuffer(bytearray(content), dtype=torch.uint8)
+            return decode_jpeg(raw, mode=ImageReadMode.RGB, device=DEVICE)
+        except Exception:
+            pass
+    image = Image.open(BytesIO(content))
+    # Convert to RGB if needed (handles RGBA, grayscale, etc.)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    # HWC uint8 -> CHW tensor; resize/crop/normalize happen on DEVICE
+    return torch.from_numpy(np.array(image)).permute(2, 0, 1)
+
+def cache_path(artwork_id):
+    """Path of the cached uint8 crop for an artwork."""
+    return os.path.join(CACHE_DIR, f"{artwork_id}.pt")
+
+def save_cached_crop(artwork_id, crop):
+    """Cache a uint8 (3, 224, 224) crop unless one already exists."""
+    path = cache_path(artwork_id)
+    if os.path.exists(path):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write then rename so an interrupted run never leaves a truncated file
+    tmp_path = f"{path}.tmp"
+    torch.save(crop.to("cpu", copy=True).contiguous(), tmp_path)
+    os.replace(tmp_path, path)
+
+def load_cached_crop(path):
+    """Load a cached uint8 (3, 224, 224) crop."""
+    return torch.load(path, weights_only=True)
+
+def remove_cached_crop(artwork_id):
+    """Delete an artwork's cached crop once its embedding is committed.
+    
+    Committed rows have a non-NULL imgVec and are never selected again.
+    """
+    try:
+        os.remove(cache_path(artwork_id))
+    except FileNotFoundError:
+        pass
+
+async def load_image(session, decode_pool, artwork):
+    """Load an artwork's cached crop, or download and decode the full image."""
+    loop = asyncio.get_running_loop()
+    path = cache_path(artwork[0])
+    if os.path.exists(path):
+        try:
+            return await loop.run_in_executor(decode_pool, load_cached_crop, path)
+        except Exception as e:
+            # Unreadable cache entry: drop it and download the image instead
+            print(f"⚠️  Discarding unreadable cached crop for {artwork[0]}: {repr(e)}")
+            try:
+                remove_cached_crop(artwork[0])
+            except OSError:
+                pass
+    try:
+        async with session.get(artwork[1]) as response:
+            response.raise_for_status()
+            content = await response.read()
+        # Decode off the event loop so downloads keep flowing
+        return await loop.run_in_executor(decode_pool, decode_image, content)
+    except Exception as e:
+        # repr() keeps the exception type; str() is empty for e.g. asyncio.TimeoutError
+        raise Exception(f"Failed to download/process image: {repr(e)}")
+
+async def download_batch(session, decode_pool, artworks):
+    """Download all images for a batch concurrently.
+    
+    Returns a list of (artwork_id, image_or_exception) in input order.
+    """
+    images = await asyncio.gather(
+        *(load_image(session, decode_pool, artwork) for artwork in artworks),
+        return_exceptions=True
+    )
+    return [(artwork[0], image) for artwork, image in zip(artworks, images)]
+
+def put_until_stopped(batch_queue, item, stop_event):
+    """Blocking put that gives up once stop_event is set; returns whether item was queued."""
+    while not stop_event.is_set():
+        try:
+            batch_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+async def download_all(artworks, batch_queue, stop_event):
+    """Download every batch over one shared aiohttp session, queueing each in order.
+    
+    Up to PREFETCH_BATCHES batches download concurrently ahead of the one being
+    queued, so a slow image in one batch doesn't hold up the next batch's downloads.
+    """
+    loop = asyncio.get_running_loop()
+    connector = aiohttp.TCPConnector(limit=DOWNLOAD_CONCURRENCY, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as decode_pool:
+            in_flight = deque()
+            
+            async def queue_oldest():
+                batch, task = in_flight.popleft()
+                downloads = await task
+                # Wait for queue space off the event loop so in-flight downloads keep going;
+                # the executor thread isn't a daemon, so it must give up once main stops
+                return await loop.run_in_executor(None, put_until_stopped, batch_queue, (batch, downloads), stop_event)
+            
+            for i in range(0, len(artworks), BATCH_SIZE):
+                batch = artworks[i:i + BATCH_SIZE]
+                in_flight.append((batch, asyncio.ensure_future(download_batch(session, decode_pool, batch))))
+                if len(in_flight) > PREFETCH_BATCHES and not await queue_oldest():
+                    return
+            while in_flight:
+                if not await queue_oldest():
+                    return
 
-def download_image(url):
-    """Download image from URL and return PIL Image."""
+def prefetch_batches(artworks, batch_queue, stop_event, producer_status):
+    """Producer thread: download batches ahead of the encode loop until stop_event is set.
+    
+    A failure is stored in producer_status["fatal"] so main doesn't mistake the
+    end-of-input sentinel for a complete run.
+    """
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        image = Image.open(BytesIO(response.content))
-        # Convert to RGB if needed (handles RGBA, grayscale, etc.)
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        return image
+        asyncio.run(download_all(artworks, batch_queue, stop_event))
     except Exception as e:
-        raise Exception(f"Failed to download/process image: {str(e)}")
+        producer_status["fatal"] = repr(e)
+    finally:
+        put_until_stopped(batch_queue, None, stop_event)
 
 def generate_embedding(model, preprocess, image):
-    """Generate CLIP embedding for a single image."""
+    """Generate CLIP embedding for a single image as a float32 (768,) ndarray."""
+    return generate_embeddings_batch(model, preprocess, [image])[0]
+
+def generate_embeddings_batch(model, preprocess, images):
+    """Generate CLIP embeddings for a list of images in a single forward pass.
+    
+    Returns one float32 (768,) ndarray per image; rows are views into a single
+    (N, 768) array rather than Python lists. pgvector's adapter still formats
+    each value as text when the rows are written.
+    """
     try:
-        # Preprocess image
-        image_tensor = preprocess(image).unsqueeze(0).to(DEVICE)
-        
-        # Generate embedding
-        with torch.no_grad():
-            image_features = model.encode_image(image_tensor)
-            # Normalize the embedding
-            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-        
-        # Convert to numpy array
-        embedding = image_features.cpu().numpy().flatten()
-        return embedding.tolist()
+        # Preprocess on DEVICE and stack into one (N, 3, 224, 224) batch.
+        # Images differ in size, so resize/crop runs per image before stacking.
+        batch = torch.stack([
+            preprocess(image.to(DEVICE, non_blocking=True)) for image in images
+        ]).contiguous(memory_format=torch.channels_last)
+        
+        # Pad short batches to BATCH_SIZE so the compiled encoder never re-traces
+        n_images = len(images)
+        if DEVICE == "cuda" and n_images < BATCH_SIZE:
+            padding = batch.new_zeros((BATCH_SIZE - n_images, *batch.shape[1:]))
+            batch = torch.cat([batch, padding]).contiguous(memory_format=torch.channels_last)
+        
+        # Generate embeddings
+        with torch.inference_mode(), torch.autocast(device_type=DEVICE, dtype=AUTOCAST_DTYPE, enabled=AUTOCAST_ENABLED):
+            image_features = model.encode_image(batch)
+        # Normalize in fp32 so the stored vector stays numerically stable
+        image_features = image_features[:n_images].float()
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        
+        # Convert to numpy array, one float32 row per image (adapted by pgvector)
+        embeddings = image_features.cpu().numpy()
+        return list(embeddings)
     except Exception as e:
-        raise Exception(f"Failed to generate embedding: {str(e)}")
+        raise Exception(f"Failed to generate embeddings: {str(e)}")
 
-def process_batch(model, preprocess, artworks, cursor):
-    """Process a batch of artworks."""
+def process_batch(model, preprocess, artworks, downloads):
+    """Encode a batch of artworks whose images have already been downloaded.
+    
+    Returns (results, encoded, crops): results holds the artworks that failed
+    before reaching the database, encoded the (artwork_id, embedding) rows to
+    write, and crops the on-device uint8 crop for each encoded artwork.
+    """
     print(f"🚀 Processing batch of {len(artworks)} artworks...")
     
     results = []
-    for artwork in artworks:
-        artwork_id = artwork[0]
-        image_url = artwork[1]
-        
+    
+    # Keep the successful downloads so they can be encoded together
+    downloaded = []
+    for artwork_id, image in downloads:
+        if isinstance(image, Exception):
+            print(f"❌ Failed: {artwork_id} - {str(image)}")
+            results.append({"success": False, "id": artwork_id, "error": str(image)})
+        else:
+            downloaded.append((artwork_id, image))
+    
+    if not downloaded:
+        return results, [], {}
+    
+    # Resize/crop on DEVICE; the full preprocess below leaves these
+    # already-cropped images unchanged
+    cropped = []
+    for artwork_id, image in downloaded:
         try:
-            print(f"📥 Processing artwork {artwork_id}: {image_url}")
-            
-            # Download image
-            image = download_image(image_url)
-            
-            # Generate embedding
-            embedding = generate_embedding(model, preprocess, image)
-            
-            # Update database
-            cursor.execute(
-                'UPDATE "met-galaxy_artwork" SET "imgVec" = %s WHERE id = %s',
-                (embedding, artwork_id)
-            )
-            
-            print(f"✅ Success: {artwork_id} -> embedding generated ({len(embedding)} dims)")
-            results.append({"success": True, "id": artwork_id})
-            
+            crop = gpu_crop(image.to(DEVICE, non_blocking=True))
         except Exception as e:
             print(f"❌ Failed: {artwork_id} - {str(e)}")
             results.append({"success": False, "id": artwork_id, "error": str(e)})
+            continue
+        cropped.append((artwork_id, crop))
+    downloaded = cropped
+    
+    # Generate embeddings for the whole batch, falling back to one image
+    # at a time if the batched forward pass fails
+    try:
+        images = [image for _, image in downloaded]
+        encoded = list(zip(
+            [artwork_id for artwork_id, _ in downloaded],
+            generate_embeddings_batch(model, preprocess, images),
+        ))
+    except Exception as e:
+        print(f"⚠️  Batch encode failed, falling back to per-image: {str(e)}")
+        encoded = []
+        for artwork_id, image in downloaded:
+            try:
+                encoded.append((artwork_id, generate_embedding(model, preprocess, image)))
+            except Exception as e:
+                print(f"❌ Failed: {artwork_id} - {str(e)}")
+                results.append({"success": False, "id": artwork_id, "error": str(e)})
     
-    return results
+    # Crops go to the writer, which caches them only if the write fails
+    crops = dict(cropped)
+    return results, encoded, {artwork_id: crops[artwork_id] for artwork_id, _ in encoded}
+
+def write_embeddings(cursor, encoded):
+    """Write a batch of (artwork_id, embedding) rows in a single UPDATE."""
+    execute_values(
+        cursor,
+        'UPDATE "met-galaxy_artwork" AS a SET "imgVec" = v.vec::halfvec '
+        'FROM (VALUES %s) AS v(id, vec) WHERE a.id = v.id',
+        encoded,
+        template="(%s, %s)",
+        # Dedup can expand a batch past BATCH_SIZE rows; keep it one statement
+        page_size=len(encoded)
+    )
+
+def cache_crops(crops):
+    """Cache uint8 crops so a rerun can skip downloading and decoding them."""
+    for artwork_id, crop in crops.items():
+        try:
+            save_cached_crop(artwork_id, crop)
+        except Exception as e:
+            print(f"⚠️  Could not cache {artwork_id}: {str(e)}")
+
+def db_writer(conn, write_queue, write_results, writer_status):
+    """Writer thread: write and commit encoded batches on its own connection.
+    
+    psycopg2 connections must not be shared across threads, so this owns conn.
+    If the connection is lost, the error is stored in writer_status["fatal"]
+    and the thread stops. Crops of a batch whose write fails are cached to
+    disk here, off the encode loop, so a rerun can skip their downloads.
+    """
+    cursor = conn.cursor()
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+        encoded, crops = item
+        try:
+            write_embeddings(cursor, encoded)
+            # Commit after each batch
+            conn.commit()
+            
+            for artwork_id, embedding in encoded:
+                print(f"✅ Success: {artwork_id} -> embedding generated ({len(embedding)} dims)")
+                write_results.append({"success": True, "id": artwork_id})
+                try:
+                    remove_cached_crop(artwork_id)
+                except OSError as e:
+                    print(f"⚠️  Could not remove cached crop for {artwork_id}: {str(e)}")
+                
+        except Exception as e:
+            for artwork_id, _ in encoded:
+                print(f"❌ Failed: {artwork_id} - {str(e)}")
+                write_results.append({"success": False, "id": artwork_id, "error": str(e)})
+            cache_crops(crops)
+            try:
+                conn.rollback()
+            except Exception as rollback_error:
+                # Connection is gone (e.g. Neon idle timeout); later batches can't be written
+                writer_status["fatal"] = f"{str(e)} (rollback failed: {str(rollback_error)})"
+                break
+
+def queue_for_writer(write_queue, item, writer, writer_status):
+    """Put an item on the writer queue, failing instead of blocking if the writer has stopped."""
+    while True:
+        if not writer.is_alive():
+            raise Exception(f"Database writer stopped: {writer_status['fatal'] or 'unknown error'}")
+        try:
+            write_queue.put(item, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+def connect_db(database_url):
+    """Open a database connection that adapts numpy arrays to pgvector values."""
+    conn = psycopg2.connect(database_url)
+    register_vector(conn)
+    return conn
 
 def main():
     try:
@@ -141,12 +461,14 @@ def main():
             database_url = database_url.replace('channel_binding=require', '')
             database_url = database_url.rstrip('&')  # Remove trailing &
         
-        conn = psycopg2.connect(database_url)
+        conn = connect_db(database_url)
         cursor = conn.cursor()
+        # Separate connection for the background writer thread
+        writer_conn = connect_db(database_url)
         print("🔌 Connected to database")
         
         # Load CLIP model
-        model, preprocess = load_clip_model()
+        model, preprocess, pil_preprocess = load_clip_model()
         
         # Get artworks that need embeddings
         batch_offset = int(os.getenv('BATCH_OFFSET', '0'))
@@ -162,47 +484,95 @@ def main():
         """, {'offset': batch_offset})
         
         artworks = cursor.fetchall()
+        # End the read transaction; all writes go through writer_conn
+        conn.commit()
         print(f"🎯 Found {len(artworks)} artworks to process")
         
         if len(artworks) == 0:
             print("🎉 No artworks to process - all done!")
             return
         
-        total_successes = 0
+        # Artworks can share an image URL; download and encode each URL once under
+        # its first artwork id, then write that embedding to every id sharing it
+        url_to_ids = defaultdict(list)
+        for artwork_id, image_url in artworks:
+            url_to_ids[image_url].append(artwork_id)
+        unique_artworks = [(ids[0], image_url) for image_url, ids in url_to_ids.items()]
+        ids_by_artwork = {ids[0]: ids for ids in url_to_ids.values()}
+        if len(unique_artworks) < len(artworks):
+            print(f"🔁 {len(artworks) - len(unique_artworks)} artworks share an image URL; "
+                  f"processing {len(unique_artworks)} unique images")
+        
         total_failures = 0
         start_time = time.time()
         
+        # Download batches in the background while the GPU encodes
+        batch_queue = queue.Queue(maxsize=PREFETCH_BATCHES)
+        stop_event = threading.Event()
+        producer_status = {"fatal": None}
+        producer = threading.Thread(
+            target=prefetch_batches, args=(unique_artworks, batch_queue, stop_event, producer_status), daemon=True
+        )
+        producer.start()
+        
+        # Write and commit in the background while the GPU encodes the next batch
+        write_queue = queue.Queue(maxsize=PREFETCH_BATCHES)
+        write_results = []
+        writer_status = {"fatal": None}
+        writer = threading.Thread(
+            target=db_writer, args=(writer_conn, write_queue, write_results, writer_status), daemon=True
+        )
+        writer.start()
+        
         # Process in batches
-        for i in range(0, len(artworks), BATCH_SIZE):
-            batch = artworks[i:i + BATCH_SIZE]
-            batch_num = i // BATCH_SIZE + 1
-            total_batches = (len(artworks) + BATCH_SIZE - 1) // BATCH_SIZE
+        total_batches = (len(unique_artworks) + BATCH_SIZE - 1) // BATCH_SIZE
+        batch_num = 0
+        while True:
+            item = batch_queue.get()
+            if item is None:
+                break
+            batch, downloads = item
+            batch_num += 1
             
             print(f"\n📊 Batch {batch_num}/{total_batches}")
             
+            if VALIDATE_PREPROCESS and batch_num == 1:
+                sample = next((image for _, image in downloads if not isinstance(image, Exception)), None)
+                if sample is not None:
+                    validate_preprocess(preprocess, pil_preprocess, sample)
+            
             batch_start = time.time()
-            results = process_batch(model, preprocess, batch, cursor)
+            results, encoded, crops = process_batch(model, preprocess, batch, downloads)
+            if encoded:
+                queue_for_writer(write_queue, ([
+                    (artwork_id, embedding)
+                    for first_id, embedding in encoded
+                    for artwork_id in ids_by_artwork[first_id]
+                ], crops), writer, writer_status)
             batch_end = time.time()
             
-            # Commit after each batch
-            conn.commit()
-            
-            successes = sum(1 for r in results if r["success"])
-            failures = sum(1 for r in results if not r["success"])
-            
-            total_successes += successes
-            total_failures += failures
+            total_failures += sum(len(ids_by_artwork[r["id"]]) for r in results)
+            written = list(write_results)
             
             batch_duration = batch_end - batch_start
             rate = len(batch) / batch_duration if batch_duration > 0 else 0
             
-            print(f"📊 Batch {batch_num} complete: {successes}/{len(batch)} successful")
+            print(f"📊 Batch {batch_num} encoded: {len(encoded)}/{len(batch)} queued for write")
             print(f"⏱️  Batch time: {batch_duration:.1f}s ({rate:.1f} imgs/sec)")
-            print(f"📈 Total progress: {total_successes} successes, {total_failures} failures")
-            
-            # Small delay between batches to be nice
-            if i + BATCH_SIZE < len(artworks):
-                time.sleep(0.5)
+            print(f"📈 Total progress: {sum(1 for r in written if r['success'])} written, "
+                  f"{total_failures + sum(1 for r in written if not r['success'])} failures")
+        
+        producer.join()
+        # Let the writer flush already-encoded batches before reporting a producer failure
+        queue_for_writer(write_queue, None, writer, writer_status)
+        writer.join()
+        if writer_status["fatal"]:
+            raise Exception(f"Database writer stopped: {writer_status['fatal']}")
+        if producer_status["fatal"]:
+            raise Exception(f"Image download producer stopped: {producer_status['fatal']}")
+        
+        total_successes = sum(1 for r in write_results if r["success"])
+        total_failures += sum(1 for r in write_results if not r["success"])
         
         total_time = time.time() - start_time
         overall_rate = len(artworks) / total_time if total_time > 0 else 0
@@ -216,6 +586,11 @@ def main():
         print(f"💥 Fatal error: {e}")
         sys.exit(1)
     finally:
+        # Release the producer if the encode loop stopped early
+        if 'stop_event' in locals():
+            stop_event.set()
+        if 'writer_conn' in locals():
+            writer_conn.close()
         if 'conn' in locals():
             conn.close()
             print("🔌 Database connection closed")
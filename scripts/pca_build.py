@@ -3,11 +3,12 @@
 PCA Basis Generation Script for Met Gallery Backend
 
 This script computes PCA components from the image embeddings stored in the database
-and saves them to pca_basis.json for use by the field-chunk endpoint.
+and saves them to pca_basis.npy (float32 basis matrix) plus a pca_basis.json
+metadata sidecar for use by the field-chunk endpoint.
 
 Requirements:
 - PostgreSQL with pgvector extension
-- Python with psycopg2, numpy, sklearn
+- Python with psycopg2, numpy
 - Database with embeddings already populated
 
 Usage:
@@ -18,12 +19,14 @@ import os
 import json
 import numpy as np
 import psycopg2
-from sklearn.decomposition import IncrementalPCA
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+N_COMPONENTS = 4
+EMBEDDING_DIM = 768
+
 def get_db_connection():
     """Create a database connection using DATABASE_URL."""
     database_url = os.getenv('DATABASE_URL')
@@ -31,50 +34,117 @@ def get_db_connection():
         raise ValueError("DATABASE_URL environment variable is required")
     return psycopg2.connect(database_url)
 
-def fetch_embeddings_batch(cursor, batch_size=8192, offset=0):
-    """Fetch a batch of embeddings from the database."""
-    query = """
-        SELECT "imgVec" 
-        FROM "met-galaxy_artwork" 
-        WHERE "imgVec" IS NOT NULL 
-        AND "localImageUrl" IS NOT NULL 
-        AND "localImageUrl" != ''
-        ORDER BY id
-        LIMIT %s OFFSET %s
+EMBEDDINGS_QUERY = """
+    SELECT "imgVec" 
+    FROM "met-galaxy_artwork" 
+    WHERE "imgVec" IS NOT NULL 
+    AND "localImageUrl" IS NOT NULL 
+    AND "localImageUrl" != ''
+"""
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER_SIZE = len(COPY_SIGNATURE) + 8  # signature + flags + extension length
+COPY_TRAILER = b"\xff\xff"
+
+def vector_record_dtype(value_type):
+    """One COPY BINARY tuple holding a single 768-d pgvector field, all big-endian.
+    
+    Field count, field byte length, then pgvector's *_send layout: dim, unused,
+    and the values (">f2" for halfvec, ">f4" for vector).
     """
-    cursor.execute(query, (batch_size, offset))
-    results = cursor.fetchall()
+    return np.dtype([
+        ("n_fields", ">i2"),
+        ("length", ">i4"),
+        ("dim", ">i2"),
+        ("unused", ">i2"),
+        ("values", value_type, (EMBEDDING_DIM,)),
+    ])
+
+# Keyed by field byte length, so legacy vector(768) columns (before the halfvec
+# migration) are read in binary too rather than parsed from text
+RECORD_DTYPES = {
+    4 + np.dtype(value_type).itemsize * EMBEDDING_DIM: vector_record_dtype(value_type)
+    for value_type in (">f2", ">f4")
+}
+RECORD_PREFIX_SIZE = 6  # field count + field byte length
+
+class VectorCopyReader:
+    """File-like sink for COPY ... TO STDOUT (FORMAT BINARY) of one halfvec or vector column.
     
-    if not results:
-        return None
-        
-    # Convert to numpy array
-    embeddings = []
-    for row in results:
-        if row[0] is not None:
-            # Parse string representation of vector
-            if isinstance(row[0], str):
-                # Remove brackets and split by comma
-                vector_str = row[0].strip('[]')
-                vector_values = [float(x) for x in vector_str.split(',')]
-                embeddings.append(vector_values)
-            else:
-                # Already a list/array
-                embeddings.append(row[0])
+    Buffers the raw stream and hands each complete batch of rows to on_batch
+    as a float32 (N, 768) array, so memory stays bounded by batch_size.
+    """
+    
+    def __init__(self, on_batch, batch_size=8192):
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.buffer = bytearray()
+        self.header_read = False
+        self.record = None
+    
+    def write(self, data):
+        self.buffer += data
+        if not self.header_read:
+            if len(self.buffer) < COPY_HEADER_SIZE:
+                return
+            if bytes(self.buffer[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+                raise ValueError("Unexpected COPY BINARY signature")
+            extension_length = int.from_bytes(self.buffer[COPY_HEADER_SIZE - 4:COPY_HEADER_SIZE], "big")
+            if len(self.buffer) < COPY_HEADER_SIZE + extension_length:
+                return
+            del self.buffer[:COPY_HEADER_SIZE + extension_length]
+            self.header_read = True
+        if self.record is None:
+            # Pick the record layout from the first row's field length
+            if len(self.buffer) < RECORD_PREFIX_SIZE:
+                return
+            length = int.from_bytes(self.buffer[2:RECORD_PREFIX_SIZE], "big", signed=True)
+            if length not in RECORD_DTYPES:
+                raise ValueError(f"Expected a halfvec({EMBEDDING_DIM}) or vector({EMBEDDING_DIM}) field, got {length} bytes")
+            self.record = RECORD_DTYPES[length]
+        if len(self.buffer) >= self.batch_size * self.record.itemsize:
+            self._flush(self.batch_size)
+    
+    def close(self):
+        """Flush the remaining rows and check the stream ended with the COPY trailer."""
+        if self.record is not None:
+            n_rows = len(self.buffer) // self.record.itemsize
+            if n_rows:
+                self._flush(n_rows)
+        if bytes(self.buffer) != COPY_TRAILER:
+            raise ValueError("COPY BINARY stream did not end with the expected trailer")
     
-    return np.array(embeddings, dtype=np.float32) if embeddings else None
+    def _flush(self, n_rows):
+        while len(self.buffer) >= n_rows * self.record.itemsize:
+            size = n_rows * self.record.itemsize
+            records = np.frombuffer(self.buffer, dtype=self.record, count=n_rows)
+            if (records["n_fields"] != 1).any() or (records["dim"] != EMBEDDING_DIM).any():
+                raise ValueError(f"Expected one {EMBEDDING_DIM}-d vector field per row")
+            # Convert to native float32 (copies, so the buffer can be released)
+            batch = records["values"].astype(np.float32)
+            del records
+            del self.buffer[:size]
+            self.on_batch(batch)
 
-def count_total_embeddings(cursor):
-    """Count total number of valid embeddings."""
-    query = """
-        SELECT COUNT(*) 
-        FROM "met-galaxy_artwork" 
-        WHERE "imgVec" IS NOT NULL 
-        AND "localImageUrl" IS NOT NULL 
-        AND "localImageUrl" != ''
+def top_eigenvectors(scatter, total_sum, n, n_components=N_COMPONENTS):
+    """Top principal components from the accumulated X^T X and column sums.
+    
+    Returns (components, explained_variance_ratio) with components as rows,
+    sign-flipped so the largest-magnitude entry of each is positive.
     """
-    cursor.execute(query)
-    return cursor.fetchone()[0]
+    mean = total_sum / n
+    cov = (scatter - n * np.outer(mean, mean)) / max(n - 1, 1)
+    
+    # eigh returns ascending eigenvalues of the symmetric covariance matrix
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+    components = eigenvectors[:, order].T
+    
+    signs = np.sign(components[np.arange(len(components)), np.argmax(np.abs(components), axis=1)])
+    components *= signs[:, None]
+    
+    explained_variance_ratio = eigenvalues[order] / np.clip(eigenvalues, 0, None).sum()
+    return components, explained_variance_ratio
 
 def main():
     print("🔄 Starting PCA basis generation...")
@@ -83,69 +153,71 @@ def main():
         # Connect to database
         print("📡 Connecting to database...")
         conn = get_db_connection()
-        cursor = conn.cursor()
         
-        # Count total embeddings
-        total_count = count_total_embeddings(cursor)
-        print(f"📊 Found {total_count} valid embeddings in database")
+        # Accumulate X^T X and column sums in one pass; eigendecompose once at the end
+        print(f"🧮 Initializing PCA with {N_COMPONENTS} components...")
+        scatter = np.zeros((EMBEDDING_DIM, EMBEDDING_DIM), dtype=np.float64)
+        total_sum = np.zeros(EMBEDDING_DIM, dtype=np.float64)
         
-        if total_count == 0:
-            print("❌ No embeddings found! Make sure to run generate-embeddings.py first.")
-            return
-            
-        # Initialize IncrementalPCA
-        print("🧮 Initializing PCA with 4 components...")
-        pca = IncrementalPCA(n_components=4, batch_size=8192)
-        
-        # Process embeddings in batches
-        batch_size = 8192
-        offset = 0
         processed = 0
+        batch_num = 0
         
-        print("⚡ Processing embeddings in batches...")
-        while offset < total_count:
-            print(f"  Processing batch {offset//batch_size + 1}: items {offset} to {min(offset + batch_size, total_count)}")
-            
-            # Fetch batch
-            batch = fetch_embeddings_batch(cursor, batch_size, offset)
-            if batch is None or len(batch) == 0:
-                break
+        def process_batch(batch):
+            nonlocal processed, batch_num, scatter, total_sum
+            batch_num += 1
+            print(f"  Processing batch {batch_num}: items {processed} to {processed + len(batch)}")
                 
-            # L2 normalize embeddings (recommended for CLIP embeddings)
-            norms = np.linalg.norm(batch, axis=1, keepdims=True)
-            batch_normalized = batch / (norms + 1e-12)
+            # L2 normalize embeddings in place (recommended for CLIP embeddings)
+            norms = np.linalg.norm(batch, axis=1)
+            norms += 1e-12
+            batch /= norms[:, None]
             
-            # Fit PCA incrementally
-            pca.partial_fit(batch_normalized)
+            # Accumulate statistics in float64 to avoid cancellation when centering
+            batch64 = batch.astype(np.float64)
+            scatter += batch64.T @ batch64
+            total_sum += batch64.sum(axis=0)
             
             processed += len(batch)
-            offset += batch_size
+        
+        # Stream embeddings with binary COPY; rows are parsed in batches as they arrive
+        print("⚡ Processing embeddings in batches...")
+        cursor = conn.cursor()
+        reader = VectorCopyReader(process_batch, batch_size=8192)
+        cursor.copy_expert(f"COPY ({EMBEDDINGS_QUERY}) TO STDOUT WITH (FORMAT BINARY)", reader)
+        reader.close()
+            
+        if processed == 0:
+            print("❌ No embeddings found! Make sure to run generate-embeddings.py first.")
+            return
             
         print(f"✅ Processed {processed} embeddings")
         
         # Get PCA components and normalize them
         print("🎯 Extracting and normalizing PCA components...")
-        U = pca.components_.astype(np.float32)
+        components, explained_variance_ratio = top_eigenvectors(scatter, total_sum, processed)
+        U = components.astype(np.float32)
         U_normalized = U / (np.linalg.norm(U, axis=1, keepdims=True) + 1e-12)
         
-        # Save to JSON file
+        # Save the basis as a little-endian float32 .npy and metadata as a JSON sidecar
+        basis_path = "pca_basis.npy"
         output_path = "pca_basis.json"
         pca_data = {
-            "basis": U_normalized.tolist(),
-            "explained_variance_ratio": pca.explained_variance_ratio_.tolist(),
+            "basis_file": basis_path,
+            "explained_variance_ratio": explained_variance_ratio.tolist(),
             "n_samples": processed,
             "n_components": len(U_normalized),
             "embedding_dim": U_normalized.shape[1]
         }
         
-        print(f"💾 Saving PCA basis to {output_path}...")
+        print(f"💾 Saving PCA basis to {basis_path} and {output_path}...")
+        np.save(basis_path, np.ascontiguousarray(U_normalized, dtype="<f4"))
         with open(output_path, "w") as f:
             json.dump(pca_data, f, indent=2)
             
         print("✅ PCA basis generation completed!")
         print(f"   Components: {len(U_normalized)}")
         print(f"   Embedding dimension: {U_normalized.shape[1]}")
-        print(f"   Explained variance ratios: {[f'{r:.3f}' for r in pca.explained_variance_ratio_]}")
+        print(f"   Explained variance ratios: {[f'{r:.3f}' for r in explained_variance_ratio]}")
         print(f"   Total samples processed: {processed}")
         
         # Close database connection
@@ -70,6 +70,25 @@ export function gaussianVector(d: number, rng: () => number) {
 // ---------- PCA basis ----------
 let BASIS: Float32Array[] = [];
 
+// Reads a 2-D little-endian float32 .npy file (as written by np.save) into rows
+export function readNpyFloat32Rows(filePath: string) {
+  const buf = fs.readFileSync(filePath);
+  if (buf.toString("latin1", 0, 6) !== "\x93NUMPY") throw new Error(`Not a .npy file: ${filePath}`);
+  const major = buf[6];
+  const headerLen = major === 1 ? buf.readUInt16LE(8) : buf.readUInt32LE(8);
+  const headerStart = major === 1 ? 10 : 12;
+  const header = buf.toString("latin1", headerStart, headerStart + headerLen);
+  if (!/'descr':\s*'<f4'/.test(header)) throw new Error(`Expected little-endian float32 in ${filePath}`);
+  if (/'fortran_order':\s*True/.test(header)) throw new Error(`Expected C-ordered array in ${filePath}`);
+  const shape = /'shape':\s*\((\d+),\s*(\d+)\)/.exec(header);
+  if (!shape) throw new Error(`Expected a 2-D array in ${filePath}`);
+  const rows = Number(shape[1]), cols = Number(shape[2]);
+  // Copy out so the rows don't depend on the Buffer's byte alignment
+  const dataStart = buf.byteOffset + headerStart + headerLen;
+  const data = new Float32Array(buf.buffer.slice(dataStart, dataStart + rows * cols * 4));
+  return Array.from({ length: rows }, (_, i) => data.subarray(i * cols, (i + 1) * cols));
+}
+
 export function loadPCABasisFromFile(filePath?: string) {
   const defaultPath = path.join(process.cwd(), "pca_basis.json");
   const finalPath = filePath || defaultPath;
@@ -77,7 +96,10 @@ export function loadPCABasisFromFile(filePath?: string) {
   try {
     const raw = fs.readFileSync(finalPath, "utf-8");
     const obj = JSON.parse(raw);
-    const basis = obj.basis as number[][];
+    // Basis lives in a .npy next to the JSON metadata; older files inline it as nested arrays
+    const basis: ArrayLike<number>[] = obj.basis_file
+      ? readNpyFloat32Rows(path.resolve(path.dirname(finalPath), obj.basis_file))
+      : obj.basis as number[][];
     BASIS = basis.map(row => normalize(Float32Array.from(row)));
     if (BASIS.length < 2) throw new Error("Need at least u1,u2 in pca_basis.json");
     console.log(`✅ Loaded PCA basis with ${BASIS.length} components from ${finalPath}`);
@@ -153,11 +153,11 @@ router.get('/similar/:id', async (req, res) => {
         localImageUrl: artworks.localImageUrl,
         primaryImage: artworks.primaryImage,
         primaryImageSmall: artworks.primaryImageSmall,
-        similarity: sql<number>`1 - ("imgVec" <=> ${targetVectorString}::vector)`.as('similarity'),
+        similarity: sql<number>`1 - ("imgVec" <=> ${targetVectorString}::halfvec)`.as('similarity'),
       })
       .from(artworks)
       .where(sql`"localImageUrl" IS NOT NULL AND "localImageUrl" != '' AND "imgVec" IS NOT NULL`)
-      .orderBy(sql`"imgVec" <=> ${targetVectorString}::vector`)
+      .orderBy(sql`"imgVec" <=> ${targetVectorString}::halfvec`)
       .limit(count);
 
     console.log(`🔍 [SIMILAR] ${similarArtworks.length} artworks for ID ${artworkId} | ${Date.now() - startTime}ms`);
@@ -76,19 +76,19 @@ router.get("/field-chunk", async (req, res) => {
     const simTight = await db.select({
       id: artworks.id, objectId: artworks.objectId, title: artworks.title, artist: artworks.artist,
       localImageUrl: artworks.localImageUrl, primaryImage: artworks.primaryImage, primaryImageSmall: artworks.primaryImageSmall,
-      sim: sql<number>`1 - ("imgVec" <=> ${vStr}::vector)`
+      sim: sql<number>`1 - ("imgVec" <=> ${vStr}::halfvec)`
     }).from(artworks)
      .where(sql`"imgVec" IS NOT NULL AND "localImageUrl" IS NOT NULL AND "localImageUrl" != '' AND ${notTarget}`)
-     .orderBy(sql`"imgVec" <=> ${vStr}::vector`)
+     .orderBy(sql`"imgVec" <=> ${vStr}::halfvec`)
      .limit(200);
 
     const simDrift = await db.select({
       id: artworks.id, objectId: artworks.objectId, title: artworks.title, artist: artworks.artist,
       localImageUrl: artworks.localImageUrl, primaryImage: artworks.primaryImage, primaryImageSmall: artworks.primaryImageSmall,
-      sim: sql<number>`1 - ("imgVec" <=> ${vpStr}::vector)`
+      sim: sql<number>`1 - ("imgVec" <=> ${vpStr}::halfvec)`
     }).from(artworks)
      .where(sql`"imgVec" IS NOT NULL AND "localImageUrl" IS NOT NULL AND "localImageUrl" != '' AND ${notTarget}`)
-     .orderBy(sql`"imgVec" <=> ${vpStr}::vector`)
+     .orderBy(sql`"imgVec" <=> ${vpStr}::halfvec`)
      .limit(400);
 
     await db.execute(sql`SELECT setseed(${seedToPgFloat(seed)})`);
@@ -268,10 +268,10 @@ router.post("/field-chunks", async (req, res) => {
     const globalSimTight = await db.select({
       id: artworks.id, objectId: artworks.objectId, title: artworks.title, artist: artworks.artist,
       localImageUrl: artworks.localImageUrl, primaryImage: artworks.primaryImage, primaryImageSmall: artworks.primaryImageSmall,
-      sim: sql<number>`1 - ("imgVec" <=> ${vStr}::vector)`
+      sim: sql<number>`1 - ("imgVec" <=> ${vStr}::halfvec)`
     }).from(artworks)
      .where(sql`"imgVec" IS NOT NULL AND "localImageUrl" IS NOT NULL AND "localImageUrl" != '' AND ${notTarget} ${excludeClause}`)
-     .orderBy(sql`"imgVec" <=> ${vStr}::vector`)
+     .orderBy(sql`"imgVec" <=> ${vStr}::halfvec`)
      .limit(simTightLimit);
 
     // Process each chunk
@@ -302,10 +302,10 @@ router.post("/field-chunks", async (req, res) => {
       const chunkSimDrift = await db.select({
         id: artworks.id, objectId: artworks.objectId, title: artworks.title, artist: artworks.artist,
         localImageUrl: artworks.localImageUrl, primaryImage: artworks.primaryImage, primaryImageSmall: artworks.primaryImageSmall,
-        sim: sql<number>`1 - ("imgVec" <=> ${vpStr}::vector)`
+        sim: sql<number>`1 - ("imgVec" <=> ${vpStr}::halfvec)`
       }).from(artworks)
        .where(sql`"imgVec" IS NOT NULL AND "localImageUrl" IS NOT NULL AND "localImageUrl" != '' AND ${notTarget} ${excludeClause}`)
-       .orderBy(sql`"imgVec" <=> ${vpStr}::vector`)
+       .orderBy(sql`"imgVec" <=> ${vpStr}::halfvec`)
        .limit(Math.min(400, simDriftLimit));
 
       // Generate random pool for this chunk